@@ -1,17 +1,53 @@
 from typing import List
-from fastapi import FastAPI
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from models import (
+    OFFLOAD_MIN_PLANTS,
     ProductionPlanRequest,
     ProductionItem,
-    productionplan,
+    productionplan_from_payload,
 )
 
 app = FastAPI(
     title="Production Plan API",
     version="0.1.0",
-    description="Calcula cuánta energía debe generar cada planta para cubrir el load."
+    description="Calcula cuánta energía debe generar cada planta para cubrir el load.",
 )
 
-@app.post("/productionplan", response_model=List[ProductionItem])
-def productionplan_endpoint(req: ProductionPlanRequest):
-    return productionplan(req)
+# El cuerpo se lee como JSON crudo; ProductionPlanRequest solo documenta el esquema en OpenAPI.
+_request_schema = ProductionPlanRequest.model_json_schema(ref_template="#/components/schemas/{model}")
+_request_defs = _request_schema.pop("$defs", {})
+
+@app.post(
+    "/productionplan",
+    response_model=List[ProductionItem],
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": _request_schema}},
+            "required": True,
+        }
+    },
+)
+async def productionplan_endpoint(request: Request):
+    try:
+        payload = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"JSON inválido: {e}")
+    plants = payload.get("powerplants") if isinstance(payload, dict) else None
+    if isinstance(plants, list) and len(plants) >= OFFLOAD_MIN_PLANTS:
+        plan = await run_in_threadpool(productionplan_from_payload, payload)
+    else:
+        plan = productionplan_from_payload(payload)
+    # Al devolver un Response ya serializado, FastAPI no valida ni serializa la salida con
+    # response_model, que queda solo para documentar la respuesta en OpenAPI.
+    return Response(content=orjson.dumps(plan), media_type="application/json")
+
+_default_openapi = app.openapi
+
+def _openapi():
+    schema = _default_openapi()
+    schema.setdefault("components", {}).setdefault("schemas", {}).update(_request_defs)
+    return schema
+
+app.openapi = _openapi
@@ -1,10 +1,35 @@
+import math
+from functools import lru_cache
 from typing import List, Literal, Tuple
+import numpy as np
 from fastapi import HTTPException
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        def wrap(fn):
+            return fn
+        return wrap
 
 PlantType = Literal["gasfired", "turbojet", "windturbine"]
 
+WIND, GAS, TURBOJET = 0, 1, 2
+PLANT_TYPE_CODE = {"windturbine": WIND, "gasfired": GAS, "turbojet": TURBOJET}
+
+DISPATCH_OK, DISPATCH_PMIN_INFEASIBLE, DISPATCH_SHORT = 0, 1, 2
+
+# Cota en décimas de MW para que cualquier suma del despacho quepa en int64.
+MAX_TENTHS = 2.0 ** 62
+
+# A partir de este tamaño el plan no se memoiza y el endpoint lo calcula fuera del event loop
+# (el kernel Numba libera el GIL).
+OFFLOAD_MIN_PLANTS = 1000
+
 class Powerplant(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore", populate_by_name=True)
+
     name: str
     type: PlantType
     efficiency: float
@@ -12,12 +37,16 @@ class Powerplant(BaseModel):
     pmax: float
 
 class Fuels(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore", populate_by_name=True)
+
     gas_eur_per_mwh: float = Field(alias="gas(euro/MWh)")
     kerosine_eur_per_mwh: float = Field(alias="kerosine(euro/MWh)")
     co2_eur_per_ton: float = Field(alias="co2(euro/ton)")
     wind_pct: float = Field(alias="wind(%)")
 
 class ProductionPlanRequest(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore", populate_by_name=True)
+
     load: float
     fuels: Fuels
     powerplants: List[Powerplant]
@@ -26,9 +55,8 @@ class ProductionItem(BaseModel):
     name: str
     p: float
 
-def round_0_1(x: float) -> float:
-    return round(x * 10) / 10.0
-
+# Versión escalar de las reglas que _merit_order aplica vectorizadas; no se usa al
+# atender peticiones, solo como referencia legible de una planta.
 def effective_bounds(p: Powerplant, fuels: Fuels) -> Tuple[float, float]:
     if p.type == "windturbine":
         return 0.0, p.pmax * (fuels.wind_pct / 100.0)
@@ -43,115 +71,217 @@ def marginal_cost(p: Powerplant, fuels: Fuels) -> float:
         return fuels.kerosine_eur_per_mwh / p.efficiency
     return 1e9
 
-def back_adjust(assignments: List[dict], indices_desc_cost: List[int], delta: float) -> float:
-    reduced = 0.0
-    for idx in indices_desc_cost:
-        a = assignments[idx]
-        room = a["p"] - a["pmin"]
-        if room <= 1e-12:
-            continue
-        take = min(room, delta - reduced)
-        if take > 0:
-            a["p"] -= take
-            reduced += take
-            if abs(reduced - delta) <= 1e-12:
-                break
-    return reduced
-
-def finalize_rounding(assignments: List[dict], target: float):
-    for a in assignments:
-        a["p"] = round_0_1(a["p"])
-
-    total = sum(a["p"] for a in assignments)
-    diff = round_0_1(target - total)
-    if abs(diff) < 0.05:
-        return
-
-    step = 0.1 if diff > 0 else -0.1
-    rem = abs(diff)
-
-    key = (lambda a: a["cost"]) if step < 0 else (lambda a: -a["cost"])
-    for a in sorted(assignments, key=key):
-        while rem >= 0.0999:
-            cand = a["p"] + step
-            if step > 0 and cand <= a["pmax"] + 1e-12:
-                a["p"] = round_0_1(cand)
-                rem = round_0_1(rem - 0.1)
-            elif step < 0 and cand >= a["pmin"] - 1e-12:
-                a["p"] = round_0_1(cand)
-                rem = round_0_1(rem - 0.1)
-            else:
-                break
-
-    total2 = sum(a["p"] for a in assignments)
-    if round_0_1(total2) != round_0_1(target):
-        raise HTTPException(status_code=422, detail="No se pudo igualar el load tras el redondeo.")
+# Todas las potencias del despacho van en enteros de décimas de MW: comparaciones exactas,
+# sin tolerancias, y la suma cuadra con el load redondeado sin un paso de ajuste posterior.
 
-def productionplan(req: ProductionPlanRequest) -> List[ProductionItem]:
-    total_cap = 0.0
-    for p in req.powerplants:
-        _, pmax = effective_bounds(p, req.fuels)
-        total_cap += pmax
-    if req.load > total_cap + 1e-9:
-        raise HTTPException(
-            status_code=422,
-            detail=f"La carga ({req.load}) supera la capacidad total ({total_cap:.1f})."
-        )
+@njit(cache=True, nogil=True)
+def back_adjust(p10: np.ndarray, pmin10: np.ndarray, indices_desc_cost: np.ndarray, delta10: int) -> int:
+    if indices_desc_cost.size == 0:
+        return 0
+    room = np.maximum(p10[indices_desc_cost] - pmin10[indices_desc_cost], 0)
+    cps = np.cumsum(room)
+    k = np.searchsorted(cps, delta10)
+    if k >= cps.size:
+        p10[indices_desc_cost] = pmin10[indices_desc_cost]
+        return cps[-1]
+    emptied = indices_desc_cost[:k]
+    p10[emptied] = pmin10[emptied]
+    p10[indices_desc_cost[k]] -= delta10 - (cps[k - 1] if k > 0 else 0)
+    return delta10
+
+@njit(cache=True, nogil=True)
+def _dispatch(pmin10: np.ndarray, pmax10: np.ndarray, cost: np.ndarray, type_code: np.ndarray, load10: int):
+    # Arrays llegan ya ordenados por mérito; devuelve (p10, DISPATCH_*).
+    n = pmin10.shape[0]
+    p10 = np.zeros(n, dtype=np.int64)
+    remaining = load10
 
-    enriched: List[dict] = []
-    for i, p in enumerate(req.powerplants):
-        pmin, pmax = effective_bounds(p, req.fuels)
-        cost = marginal_cost(p, req.fuels)
-        enriched.append({
-            "idx": i, "name": p.name, "type": p.type, "eff": p.efficiency,
-            "pmin": max(0.0, float(pmin)),
-            "pmax": max(0.0, float(pmax)),
-            "cost": float(cost),
-            "p": 0.0
-        })
-
-    enriched.sort(key=lambda x: (x["cost"], -x["eff"], x["pmin"]))
-
-    remaining = req.load
-
-    for a in enriched:
-        if a["type"] == "windturbine" and remaining > 0:
-            take = min(remaining, a["pmax"])
-            a["p"] = take
-            remaining -= take
-
-    thermal_idx = [i for i, a in enumerate(enriched) if a["type"] != "windturbine"]
+    for i in np.flatnonzero(type_code == WIND):
+        if remaining <= 0:
+            break
+        take = min(remaining, pmax10[i])
+        p10[i] = take
+        remaining -= take
+
+    thermal_idx = np.flatnonzero(type_code != WIND)
+    thermal_by_cost_desc = thermal_idx[np.argsort(-cost[thermal_idx], kind="mergesort")]
     for i in thermal_idx:
-        if remaining <= 1e-9:
+        if remaining <= 0:
             break
-        a = enriched[i]
-        if remaining >= a["pmin"]:
-            take = min(a["pmax"], remaining)
-            a["p"] = max(a["pmin"], take)
-            remaining -= a["p"]
+        if remaining >= pmin10[i]:
+            p10[i] = max(pmin10[i], min(pmax10[i], remaining))
+            remaining -= p10[i]
         else:
-            a["p"] = a["pmin"]
-            over = a["p"] - remaining
-            prev = [j for j in thermal_idx if j < i]
-            prev.sort(key=lambda j: enriched[j]["cost"], reverse=True)
-            reduced = back_adjust(enriched, prev, over)
-            if reduced + 1e-12 < over:
-                raise HTTPException(status_code=422, detail="Inviable por Pmin: no se puede retroceder más.")
-            remaining = 0.0
-
-    if remaining > 1e-9:
-        for a in enriched:
-            if a["p"] < a["pmax"] - 1e-12:
-                add = min(a["pmax"] - a["p"], remaining)
-                a["p"] += add
-                remaining -= add
-                if remaining <= 1e-9:
-                    break
-
-    if remaining > 1e-6:
+            p10[i] = pmin10[i]
+            over = p10[i] - remaining
+            prev = thermal_by_cost_desc[thermal_by_cost_desc < i]
+            if back_adjust(p10, pmin10, prev, over) < over:
+                return p10, DISPATCH_PMIN_INFEASIBLE
+            remaining = 0
+
+    if remaining > 0:
+        headroom = np.maximum(pmax10 - p10, 0)
+        cps = np.cumsum(headroom)
+        k = np.searchsorted(cps, remaining)
+        p10[:k] += headroom[:k]
+        if k < n:
+            p10[k] += remaining - (cps[k - 1] if k > 0 else 0)
+            remaining = 0
+        else:
+            remaining -= cps[-1]
+
+    if remaining != 0:
+        return p10, DISPATCH_SHORT
+    return p10, DISPATCH_OK
+
+def _readonly(*arrays: np.ndarray) -> Tuple[np.ndarray, ...]:
+    for arr in arrays:
+        arr.flags.writeable = False
+    return arrays
+
+# Compila (o carga de la caché) el kernel al importar para no pagarlo en la primera petición.
+# Se calienta con arrays de solo lectura, que es como llegan desde _merit_order.
+_dispatch(
+    *_readonly(
+        np.zeros(1, dtype=np.int64),
+        np.zeros(1, dtype=np.int64),
+        np.zeros(1),
+        np.zeros(1, dtype=np.int8),
+    ),
+    0,
+)
+
+# (name, type_code, efficiency, pmin, pmax) por planta, en el orden de la petición.
+PlantRow = Tuple[str, int, float, float, float]
+
+def _merit_order(fuels: Tuple[float, float, float], plants: Tuple[PlantRow, ...]):
+    # Pura: mismas tarifas y plantas dan los mismos arrays, que _cached_merit_order reutiliza
+    # entre peticiones; se devuelven de solo lectura para que cualquier modificación falle
+    # en lugar de contaminar respuestas posteriores.
+    gas, kerosine, wind_pct = fuels
+    n = len(plants)
+    type_code = np.fromiter((row[1] for row in plants), dtype=np.int8, count=n)
+    eff, pmin_raw, pmax_raw = np.array([row[2:] for row in plants], dtype=np.float64).reshape(n, 3).T
+
+    fuel_per_mwh = np.array([0.0, gas, kerosine])
+    cost = np.zeros(n)
+    np.divide(fuel_per_mwh[type_code], eff, out=cost, where=type_code != WIND)
+
+    wind_frac = wind_pct / 100.0
+    is_wind = type_code == WIND
+    pmin = np.where(is_wind, 0.0, pmin_raw)
+    pmax = np.where(is_wind, pmax_raw * wind_frac, pmax_raw)
+    total_cap = float(pmax.sum())
+
+    np.maximum(pmin, 0.0, out=pmin)
+    np.maximum(pmax, 0.0, out=pmax)
+    tenths = (pmin.sum() + pmax.sum()) * 10.0
+    if not np.isfinite(tenths) or tenths >= MAX_TENTHS:
+        raise HTTPException(status_code=422, detail="Los pmin/pmax están fuera del rango admitido.")
+
+    # Orden (cost, -eff, pmin) exacto y estable en una sola llamada nativa; una clave
+    # compuesta en float mezclaría los desempates al perder precisión.
+    order = np.lexsort((pmin, -eff, cost))
+    pmin10 = np.rint(pmin[order] * 10.0).astype(np.int64)
+    pmax10 = np.rint(pmax[order] * 10.0).astype(np.int64)
+    return (*_readonly(pmin10, pmax10, cost[order], type_code[order], order), total_cap)
+
+# Solo se memoizan planes pequeños: las claves y los arrays de los grandes se quedarían
+# en memoria toda la vida del proceso.
+_cached_merit_order = lru_cache(maxsize=128)(_merit_order)
+
+def _plan(plants: Tuple[PlantRow, ...], load: float,
+          gas: float, kerosine: float, wind_pct: float) -> List[dict]:
+    if not np.isfinite(load) or abs(load) * 10.0 >= MAX_TENTHS:
+        raise HTTPException(status_code=422, detail=f"La carga ({load}) está fuera del rango admitido.")
+
+    prepare = _merit_order if len(plants) >= OFFLOAD_MIN_PLANTS else _cached_merit_order
+    pmin10, pmax10, cost, type_code, order, total_cap = prepare((gas, kerosine, wind_pct), plants)
+    if load > total_cap + 1e-9:
+        raise HTTPException(
+            status_code=422,
+            detail=f"La carga ({load}) supera la capacidad total ({total_cap:.1f})."
+        )
+
+    load10 = int(round(load * 10))
+    if load10 < 0:
+        raise HTTPException(status_code=422, detail=f"La carga ({load}) no puede ser negativa.")
+
+    p10, status = _dispatch(pmin10, pmax10, cost, type_code, load10)
+    if status == DISPATCH_PMIN_INFEASIBLE:
+        raise HTTPException(status_code=422, detail="Inviable por Pmin: no se puede retroceder más.")
+    if status == DISPATCH_SHORT:
         raise HTTPException(status_code=422, detail="Capacidad insuficiente.")
 
-    finalize_rounding(enriched, req.load)
+    p_out = np.empty(len(plants))
+    p_out[order] = p10 / 10.0
+    return [{"name": row[0], "p": v} for row, v in zip(plants, p_out.tolist())]
+
+def productionplan(req: ProductionPlanRequest) -> List[ProductionItem]:
+    plants = tuple((p.name, PLANT_TYPE_CODE[p.type], p.efficiency, p.pmin, p.pmax) for p in req.powerplants)
+    fuels = req.fuels
+    plan = _plan(plants, req.load, fuels.gas_eur_per_mwh, fuels.kerosine_eur_per_mwh, fuels.wind_pct)
+    return [ProductionItem.model_construct(**item) for item in plan]
+
+def _path(loc: tuple) -> str:
+    # ("powerplants", 2, "pmin") -> "powerplants[2].pmin"
+    path = "".join(f"[{k}]" if isinstance(k, int) else f".{k}" for k in loc).lstrip(".")
+    return path or "el cuerpo"
+
+def _invalid(loc: tuple, msg: str) -> HTTPException:
+    return HTTPException(status_code=422, detail=f"Campo inválido en {_path(loc)}: {msg}.")
+
+def _field(obj, key: str, loc: tuple):
+    if not isinstance(obj, dict):
+        raise _invalid(loc, "se esperaba un objeto")
+    if key not in obj:
+        raise _invalid((*loc, key), "falta el campo")
+    return obj[key]
+
+def _text(obj, key: str, loc: tuple) -> str:
+    value = _field(obj, key, loc)
+    if not isinstance(value, str):
+        raise _invalid((*loc, key), "se esperaba un texto")
+    return value
+
+def _number(obj, key: str, loc: tuple) -> float:
+    value = _field(obj, key, loc)
+    # bool es subclase de int, pero true/false no son potencias ni precios válidos.
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise _invalid((*loc, key), "se esperaba un número")
+    try:
+        value = float(value)
+    except OverflowError:
+        value = math.inf
+    if not math.isfinite(value):
+        raise _invalid((*loc, key), "se esperaba un número finito")
+    return value
+
+def _plant_type(obj, loc: tuple) -> int:
+    value = _field(obj, "type", loc)
+    if not isinstance(value, str) or value not in PLANT_TYPE_CODE:
+        raise _invalid((*loc, "type"), "se esperaba 'gasfired', 'turbojet' o 'windturbine'")
+    return PLANT_TYPE_CODE[value]
+
+def productionplan_from_payload(payload: dict) -> List[dict]:
+    # Ruta sin Pydantic: lee y valida directamente el JSON ya decodificado, en una sola pasada.
+    # Devuelve 422 con la ruta del primer campo inválido, p. ej. "powerplants[2].pmin".
+    load = _number(payload, "load", ())
+    fuels = _field(payload, "fuels", ())
+    gas = _number(fuels, "gas(euro/MWh)", ("fuels",))
+    kerosine = _number(fuels, "kerosine(euro/MWh)", ("fuels",))
+    # El CO2 no entra en el coste, pero forma parte del esquema y se valida igual.
+    _number(fuels, "co2(euro/ton)", ("fuels",))
+    wind_pct = _number(fuels, "wind(%)", ("fuels",))
 
-    by_name = {a["name"]: a["p"] for a in enriched}
-    return [ProductionItem(name=p.name, p=round_0_1(by_name[p.name])) for p in req.powerplants]
+    powerplants = _field(payload, "powerplants", ())
+    if not isinstance(powerplants, list):
+        raise _invalid(("powerplants",), "se esperaba una lista")
+    plants = []
+    for i, pp in enumerate(powerplants):
+        loc = ("powerplants", i)
+        plants.append((
+            _text(pp, "name", loc), _plant_type(pp, loc),
+            _number(pp, "efficiency", loc), _number(pp, "pmin", loc), _number(pp, "pmax", loc),
+        ))
+    return _plan(tuple(plants), load, gas, kerosine, wind_pct)
@@ -159,7 +159,7 @@ def productionplan(req: ProductionPlanRequest) -> List[ProductionItem]:
     finalize_rounding(enriched, req.load)
 
     by_name = {a["name"]: a["p"] for a in enriched}
-    return [ProductionItem(name=p.name, p=round_0_1(by_name[p.name])) for p in req.powerplants]
+    return [ProductionItem.model_construct(name=p.name, p=round_0_1(by_name[p.name])) for p in req.powerplants]
 
 @app.post("/productionplan", response_model=List[ProductionItem])
 def productionplan_endpoint(req: ProductionPlanRequest):
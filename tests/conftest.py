@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# app/ se ejecuta como carpeta suelta (main.py hace "from models import ..."), no como paquete.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
@@ -0,0 +1,34 @@
+import json
+from pathlib import Path
+
+import orjson
+from fastapi.testclient import TestClient
+
+from main import app
+from models import productionplan_from_payload
+
+PAYLOAD1 = Path(__file__).resolve().parents[1] / "app" / "payload1.json"
+
+client = TestClient(app)
+
+
+def test_endpoint_returns_preserialized_plan():
+    payload = json.loads(PAYLOAD1.read_text())
+    response = client.post("/productionplan", content=PAYLOAD1.read_bytes())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == orjson.dumps(productionplan_from_payload(payload))
+
+
+def test_endpoint_documents_response_model():
+    schema = client.get("/openapi.json").json()
+    ok = schema["paths"]["/productionplan"]["post"]["responses"]["200"]
+    items = ok["content"]["application/json"]["schema"]["items"]
+    assert items == {"$ref": "#/components/schemas/ProductionItem"}
+    assert {"Fuels", "Powerplant", "ProductionItem"} <= schema["components"]["schemas"].keys()
+
+
+def test_endpoint_rejects_invalid_json():
+    response = client.post("/productionplan", content=b"{nope")
+    assert response.status_code == 422
+    assert response.json()["detail"].startswith("JSON inválido")
@@ -0,0 +1,96 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+from models import ProductionPlanRequest, productionplan, productionplan_from_payload
+
+PAYLOAD1 = Path(__file__).resolve().parents[1] / "app" / "payload1.json"
+
+FUELS = {"gas(euro/MWh)": 13.4, "kerosine(euro/MWh)": 50.8, "co2(euro/ton)": 20, "wind(%)": 60}
+
+
+def plant(name, type_="gasfired", efficiency=0.5, pmin=0, pmax=100):
+    return {"name": name, "type": type_, "efficiency": efficiency, "pmin": pmin, "pmax": pmax}
+
+
+def plan(load, *plants, fuels=FUELS):
+    result = productionplan_from_payload({"load": load, "fuels": fuels, "powerplants": list(plants)})
+    return {item["name"]: item["p"] for item in result}
+
+
+def reject(load, *plants):
+    with pytest.raises(HTTPException) as exc:
+        plan(load, *plants)
+    assert exc.value.status_code == 422
+    return exc.value.detail
+
+
+def test_payload1():
+    payload = json.loads(PAYLOAD1.read_text())
+    expected = [
+        {"name": "gasfiredbig1", "p": 368.4},
+        {"name": "gasfiredbig2", "p": 0.0},
+        {"name": "gasfiredsomewhatsmaller", "p": 0.0},
+        {"name": "tj1", "p": 0.0},
+        {"name": "windpark1", "p": 90.0},
+        {"name": "windpark2", "p": 21.6},
+    ]
+    assert productionplan_from_payload(payload) == expected
+    req = ProductionPlanRequest.model_validate(payload)
+    assert [item.model_dump() for item in productionplan(req)] == expected
+
+
+def test_result_sums_to_rounded_load():
+    payload = json.loads(PAYLOAD1.read_text())
+    payload["load"] = 480.04
+    assert round(sum(item["p"] for item in productionplan_from_payload(payload)), 1) == 480.0
+
+
+def test_back_adjustment_reduces_cheaper_plant_to_fit_pmin():
+    # gas1 cubre 100; quedan 20 < pmin de gas2, que entra a 50 y obliga a bajar gas1 a 70.
+    result = plan(120, plant("gas1", efficiency=0.6), plant("gas2", efficiency=0.4, pmin=50))
+    assert result == {"gas1": 70.0, "gas2": 50.0}
+
+
+def test_pmin_infeasible():
+    assert reject(50, plant("gas1", pmin=100, pmax=200)) == "Inviable por Pmin: no se puede retroceder más."
+
+
+def test_load_above_capacity():
+    assert "supera la capacidad total" in reject(300, plant("gas1", pmax=200))
+
+
+def test_negative_load():
+    assert "no puede ser negativa" in reject(-5, plant("gas1"))
+
+
+def test_huge_load():
+    assert "fuera del rango admitido" in reject(1e19, plant("gas1"))
+
+
+def test_huge_pmax():
+    assert "fuera del rango admitido" in reject(100, plant("gas1", pmax=1e19))
+
+
+def test_bounds_are_honoured_to_a_tenth():
+    # Los límites se redondean a 0.1 MW: pmin 109.44 se puede despachar a 109.4 (±0.05 MW).
+    assert plan(109.4, plant("gas1", pmin=109.44, pmax=200)) == {"gas1": 109.4}
+    wind = plant("wind1", type_="windturbine", efficiency=1, pmax=36)
+    assert plan(21.6, wind) == {"wind1": 21.6}
+
+
+@pytest.mark.parametrize("payload, path", [
+    ([], "el cuerpo"),
+    ({"fuels": FUELS, "powerplants": []}, "load"),
+    ({"load": 10, "fuels": {**FUELS, "co2(euro/ton)": "20"}, "powerplants": []}, "fuels.co2(euro/ton)"),
+    ({"load": 10, "fuels": FUELS, "powerplants": [plant("a"), plant("b", pmin=True)]}, "powerplants[1].pmin"),
+    ({"load": 10, "fuels": FUELS, "powerplants": [plant("a", type_="nuclear")]}, "powerplants[0].type"),
+    ({"load": 10, "fuels": FUELS, "powerplants": [plant("a", pmax=10 ** 400)]}, "powerplants[0].pmax"),
+])
+def test_invalid_field_is_named(payload, path):
+    with pytest.raises(HTTPException) as exc:
+        productionplan_from_payload(payload)
+    assert exc.value.status_code == 422
+    assert exc.value.detail.startswith(f"Campo inválido en {path}: ")